@@ -1,4 +1,5 @@
 import unittest, os
+from StringIO import StringIO
 from lxml import etree
 from xmlvalidator import *
 
@@ -218,4 +219,90 @@ class RuleTests(unittest.TestCase):
             
     def tearDown(self):
         #self.valid_doc.freeDoc()
-        pass
\ No newline at end of file
+        pass
+        
+class StreamingTests(unittest.TestCase):
+    def setUp(self):
+        self.name = 'Testing Rule Name'
+        self.desc = 'Testing Rule Description'
+        self.valid_doc = etree.parse(VALID_FILE)
+        self.either_or_file = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'test-files', 'either-or-test.xml')
+        self.rule_set = [ExistsRule(self.name, self.desc, '//gmd:MD_Metadata/gmd:fileIdentifier/gco:CharacterString'),
+                         ExistsRule(self.name, self.desc, '/invalid/xpath/expression'),
+                         ValueInListRule(self.name, self.desc, '//gmd:MD_Metadata/gmd:language/gco:CharacterString', ['eng', 'spa']),
+                         ValueInListRule(self.name, self.desc, '//gmd:MD_Metadata/gmd:language/gco:CharacterString', ['pants', 'shoes']),
+                         ContentMatchesExpressionRule(self.name, self.desc, '//gmd:MD_Metadata/gmd:fileIdentifier/gco:CharacterString', '^[\w]{8}-[\w]{4}-[\w]{4}-[\w]{4}-[\w]{12}$'),
+                         ContentMatchesExpressionRule(self.name, self.desc, '//gmd:MD_Metadata/gmd:fileIdentifier/gco:CharacterString', '00C02E67-F1ED'),
+                         OneOfRule(self.name, self.desc, ['//gmd:individualName/gco:CharacterString', '/hibbity/haw/haw'])]
+        
+    def test_analysis(self):
+        # Simple element paths can be streamed
+        self.assertTrue(StreamingEvaluator(self.rule_set).streamable)
+        
+        # Attribute paths, unknown prefixes, poorly-formed XPaths and unsupported rules need the full tree
+        attr_xpath = '//gmd:MD_Metadata/gmd:characterSet/gmd:MD_CharacterSetCode/@codeListValue'
+        self.assertFalse(StreamingEvaluator([ValueInListRule(self.name, self.desc, attr_xpath, ['utf8'])]).streamable)
+        self.assertFalse(StreamingEvaluator([ExistsRule(self.name, self.desc, '//nope:thing')]).streamable)
+        self.assertFalse(StreamingEvaluator([ExistsRule(self.name, self.desc, '/hee/hee/hibbity/hee/')]).streamable)
+        # lxml ignores surrounding whitespace, which would otherwise end up in the last step
+        self.assertFalse(StreamingEvaluator([ExistsRule(self.name, self.desc, '//gmd:MD_Metadata/gmd:fileIdentifier/gco:CharacterString\n')]).streamable)
+        self.assertFalse(StreamingEvaluator([AnyOfRule(self.name, self.desc, ['/one', '/two'], '//thing')]).streamable)
+        
+    def test_matches_tree(self):
+        # Every rule should give the same answer against the streamed document as against the tree
+        doc = StreamingEvaluator(self.rule_set).parse(VALID_FILE)
+        for rule in self.rule_set:
+            self.assertEqual(rule.validate(doc), rule.validate(self.valid_doc), 'Streaming result differs from tree result for ' + str(rule.__dict__))
+            
+        # A trailing newline, as read from a config file, gives the same result either way
+        newline_rule_set = [ExistsRule(self.name, self.desc, '//gmd:MD_Metadata/gmd:fileIdentifier/gco:CharacterString\n')]
+        result, report = record_is_valid(VALID_FILE, newline_rule_set, streaming=True)
+        self.assertTrue(result)
+        self.assertEqual((result, report), record_is_valid(VALID_FILE, newline_rule_set))
+            
+        xpaths = ['/clothing/footwear/sneakers', '/clothing/footwear/hightops', '/clothing/leggings/pants']
+        either_or_rules = [OneOfRule(self.name, self.desc, xpaths[:2]), OneOfRule(self.name, self.desc, [xpaths[0], xpaths[2]])]
+        either_or_doc = StreamingEvaluator(either_or_rules).parse(self.either_or_file)
+        tree_doc = etree.parse(self.either_or_file)
+        for rule in either_or_rules:
+            self.assertEqual(rule.validate(either_or_doc), rule.validate(tree_doc))
+            
+    def test_conditional_rule(self):
+        xpath_one = '//gmd:MD_Metadata/gmd:contact/gmd:CI_ResponsibleParty/gmd:contactInfo/gmd:CI_Contact/gmd:onlineResource/gmd:CI_OnlineResource/gmd:name/gco:CharacterString'
+        xpath_two = '//gmd:MD_Metadata/gmd:contact/gmd:CI_ResponsibleParty/gmd:contactInfo/gmd:CI_Contact/gmd:onlineResource/gmd:CI_OnlineResource/gmd:linkage/gmd:URL'
+        conditional_rules = [ConditionalRule(self.name, self.desc, [ValueInListRule(self.name, self.desc, xpath_one, ['icon']), ExistsRule(self.name, self.desc, xpath_two)]),
+                             ConditionalRule(self.name, self.desc, [ValueInListRule(self.name, self.desc, xpath_one, ['icon']), ExistsRule(self.name, self.desc, '/invalid/xpath/expression')])]
+        
+        # Conditional rules made of streamable rules can be streamed, and give the same answers as the tree
+        evaluator = StreamingEvaluator(conditional_rules)
+        self.assertTrue(evaluator.streamable)
+        doc = evaluator.parse(VALID_FILE)
+        for rule in conditional_rules:
+            self.assertEqual(rule.validate(doc), rule.validate(self.valid_doc))
+        self.assertFalse(conditional_rules[1].validate(doc))
+        
+    def test_prolog(self):
+        # Comments and processing instructions before the root element have no parent
+        doc = StreamingEvaluator([ExistsRule(self.name, self.desc, '/a/b')]).parse(StringIO('<?xml-stylesheet href="style.xsl"?><!-- comment --><a><b>text</b></a>'))
+        self.assertEqual([node.text for node in doc.xpath('/a/b')], ['text'])
+        
+        commented_file = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'test-files', 'usgin-dataset-template.xml')
+        self.assertEqual(record_is_valid(commented_file, self.rule_set, streaming=True)[1], record_is_valid(commented_file, self.rule_set)[1])
+        
+    def test_record_is_valid(self):
+        result, report = record_is_valid(VALID_FILE, self.rule_set, streaming=True)
+        self.assertFalse(result)
+        self.assertEqual(len(report), 3)
+        self.assertEqual(report, record_is_valid(VALID_FILE, self.rule_set)[1])
+        
+        # Rule sets that cannot be streamed fall back to the tree
+        attr_xpath = '//gmd:MD_Metadata/gmd:characterSet/gmd:MD_CharacterSetCode/@codeListValue'
+        tree_rule_set = [ValueInListRule(self.name, self.desc, attr_xpath, ['utf8']),
+                         AnyOfRule(self.name, self.desc, ['//gmd:individualName/gco:CharacterString', '/hibbity/haw/haw'])]
+        result, report = record_is_valid(VALID_FILE, tree_rule_set, streaming=True)
+        self.assertTrue(result)
+        self.assertEqual(len(report), 0)
+        
+        # Unparsable documents are still rejected
+        invalid_filepath = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'test-files', 'not-parsable.xml')
+        self.assertRaises(ValidationException, record_is_valid, invalid_filepath, self.rule_set, True)
@@ -40,7 +40,7 @@ def url_is_valid(url):
     
     return result, response
                 
-def record_is_valid(filepath, rule_set=None):
+def record_is_valid(filepath, rule_set=None, streaming=False):
     # First, is it a valid file?
     if os.path.exists(filepath):
         content = filepath
@@ -53,11 +53,23 @@ def record_is_valid(filepath, rule_set=None):
             req = urllib2.Request(filepath)
             content = urllib2.urlopen(req)
             
+    # Rule sets that only look at simple element paths can be checked in a single streaming pass.
+    #   This keeps memory flat on very large records, but takes longer than building the tree, so it is opt-in.
+    if streaming:
+        evaluator = StreamingEvaluator(rule_set)
+        streaming = evaluator.streamable
+        
     # Insure the document is valid: Must be parse-able by lxml
-    try:
-        doc = etree.parse(content)
-    except Exception as (ex):
-        raise ValidationException(ex.msg)
+    if streaming:
+        try:
+            doc = evaluator.parse(content)
+        except etree.XMLSyntaxError as (ex):
+            raise ValidationException(ex.msg)
+    else:
+        try:
+            doc = etree.parse(content)
+        except Exception as (ex):
+            raise ValidationException(ex.msg)
     
     # Initiate a report
     report = ValidationReport()
@@ -250,4 +262,136 @@ class ConditionalRule(Rule):
         else:
             # The first rule did not validate, but doc is valid because condition means that we only fail
             #   if the first rule is passed and the second is failed.
-            return True
\ No newline at end of file
+            return True
+
+# An absolute or //-prefixed path made only of (optionally prefixed) element names
+simple_path = re.compile(r'^//?[A-Za-z_][\w.\-]*(:[A-Za-z_][\w.\-]*)?(/[A-Za-z_][\w.\-]*(:[A-Za-z_][\w.\-]*)?)*\Z')
+
+class MatchedNode():
+    # Stands in for an element matched during a streaming pass. Only the text is kept.
+    def __init__(self, text):
+        self.text = text
+
+class StreamedDocument():
+    def __init__(self, matches):
+        self.matches = matches
+        
+    def xpath(self, xpath, namespaces=None):
+        # Only the paths collected during the streaming pass can be answered
+        return self.matches[xpath]
+
+class StreamingEvaluator():
+    def __init__(self, rule_set):
+        # Map each simple path to the list of Clark-notation tags it steps through
+        self.paths = dict()
+        self.root_starts = dict()
+        self.descendant_starts = dict()
+        
+        # Without a rule set there is nothing to stream. Leave the tree path to report on it.
+        self.streamable = rule_set != None
+        if not self.streamable: return
+        
+        try:
+            for rule in rule_set:
+                for xpath in self.rule_xpaths(rule):
+                    self.paths[xpath] = self.path_steps(xpath)
+        except ValueError:
+            self.streamable = False
+            self.paths = dict()
+            return
+        
+        # Index the paths by their first step. Absolute paths can only start at the root element.
+        for xpath, steps in self.paths.items():
+            if xpath.startswith('//'):
+                self.descendant_starts.setdefault(steps[0], []).append(xpath)
+            else:
+                self.root_starts.setdefault(steps[0], []).append(xpath)
+        
+    def rule_xpaths(self, rule):
+        # Only rules that read nothing but the nodes' text at their own XPaths can be streamed.
+        #   Subclasses may override validate, so the exact class is checked.
+        rule_class = getattr(rule, '__class__', None)
+        if rule_class in (ExistsRule, ValueInListRule, ContentMatchesExpressionRule):
+            return [rule.xpath]
+        if rule_class == OneOfRule:
+            return list(rule.xpaths)
+        if rule_class == ConditionalRule and len(rule.rule_set) == 2:
+            xpaths = list()
+            for sub_rule in rule.rule_set:
+                xpaths.extend(self.rule_xpaths(sub_rule))
+            return xpaths
+        raise ValueError('Rule cannot be evaluated while streaming: ' + str(rule))
+        
+    def path_steps(self, xpath):
+        if not isinstance(xpath, basestring) or simple_path.match(xpath) == None:
+            raise ValueError('Not a simple element path: ' + str(xpath))
+        
+        steps = list()
+        for step in xpath.lstrip('/').split('/'):
+            if ':' in step:
+                prefix, local = step.split(':')
+                # Unknown prefixes are an XPath error. Leave it to lxml to report.
+                if prefix not in ns: raise ValueError('Unknown namespace prefix: ' + prefix)
+                steps.append('{' + ns[prefix] + '}' + local)
+            else:
+                steps.append(step)
+        return steps
+        
+    def transition(self, states, tag):
+        # Work out the states reached by an element with this tag, given its parent's states.
+        #   The parent of the root element has no states of its own: the root can only start absolute paths.
+        if states == None:
+            reached = set((xpath, 1) for xpath in self.root_starts.get(tag, []))
+        else:
+            reached = set()
+            for xpath, position in states:
+                steps = self.paths[xpath]
+                if position < len(steps) and steps[position] == tag:
+                    reached.add((xpath, position + 1))
+        for xpath in self.descendant_starts.get(tag, []):
+            reached.add((xpath, 1))
+            
+        completed = [xpath for xpath, position in reached if position == len(self.paths[xpath])]
+        return frozenset(reached), completed
+        
+    def parse(self, content):
+        matches = dict((xpath, []) for xpath in self.paths)
+        
+        # Transitions are cached by (parent states, tag), so most elements cost a single lookup.
+        #   Nodes are recorded at the start tag to keep them in document order.
+        transitions = dict()
+        state_stack = [None]
+        node_stack = list()
+        for event, elem in etree.iterparse(content, events=('start', 'end')):
+            if event == 'start':
+                key = (state_stack[-1], elem.tag)
+                if key not in transitions:
+                    transitions[key] = self.transition(*key)
+                states, completed = transitions[key]
+                state_stack.append(states)
+                
+                nodes = None
+                if completed:
+                    nodes = [MatchedNode(None) for xpath in completed]
+                    for xpath, node in zip(completed, nodes):
+                        matches[xpath].append(node)
+                node_stack.append(nodes)
+                
+            else:
+                state_stack.pop()
+                
+                # The text is only complete once the element has ended
+                nodes = node_stack.pop()
+                if nodes:
+                    for node in nodes:
+                        node.text = elem.text
+                        
+                # Nothing else is needed from this element. Drop it, and any finished siblings, to keep memory flat.
+                #   Comments and processing instructions before the root element have no parent to be removed from.
+                elem.clear()
+                parent = elem.getparent()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+                        
+        return StreamedDocument(matches)